@@ -316,8 +316,7 @@ class MatrixKernel {
         }
 
         this.fontMgr = new FontManager(this.config, this.notifications);
-        this.charSelector = new CharacterSelectorModal(this.config, this.fontMgr, this.notifications);
-        this.ui = new UIManager(this.config, this.effectRegistry, this.fontMgr, this.notifications, this.charSelector);
+        this._initializeUI();
 
         // Overlay Canvas Setup
         this.overlayCanvas = document.getElementById('overlayCanvas');
@@ -336,6 +335,21 @@ class MatrixKernel {
         await this.fontMgr.init();
     }
 
+    /**
+     * Creates the CharacterSelectorModal and UIManager. Safe to call repeatedly: in
+     * code-split builds the UI classes arrive in a deferred chunk after the first
+     * frame, and the chunk loader calls this again once they are defined.
+     * @returns {boolean} True if the UI exists after the call.
+     */
+    _initializeUI() {
+        if (this.ui) return true;
+        if (!this.fontMgr || typeof UIManager === 'undefined' || typeof CharacterSelectorModal === 'undefined') return false;
+
+        this.charSelector = new CharacterSelectorModal(this.config, this.fontMgr, this.notifications);
+        this.ui = new UIManager(this.config, this.effectRegistry, this.fontMgr, this.notifications, this.charSelector);
+        return true;
+    }
+
     /**
      * Sets up listeners to detect user inactivity and pause the simulation if configured.
      * @private
@@ -408,7 +422,7 @@ class MatrixKernel {
                 if (boundKey && boundKey.toLowerCase() === key) {
                     matched = true;
                     if (action === 'ToggleUI') {
-                        this.ui.togglePanel();
+                        if (this.ui) this.ui.togglePanel();
                     } else if (action === 'BootSequence' || action === 'CrashSequence') { 
                         this.effectRegistry.trigger(action, true);
                         this.notifications.show(`${action} Triggered`, 'success');
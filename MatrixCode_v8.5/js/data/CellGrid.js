@@ -23,6 +23,78 @@ const OVERRIDE_MODE = {
     DUAL: 5
 };
 
+// Per-cell storage layout. Every field is a typed-array view into one buffer
+// (struct-of-arrays) so resize and worker hand-off move a single allocation.
+// `per` is the number of elements per cell (default 1). `clone: false` keeps a field
+// out of copyFrom (override/effect layers and envGlows are not cloned between worlds).
+// Add new fields here only.
+// matrix_builder.py parses this table for its size calculator: keep one field per line.
+const CELL_GRID_LAYOUT = [
+    // Core
+    { name: 'activeFlag', type: 'Uint8' }, // 0/1 (Shared for Worker consistency)
+    { name: 'state', type: 'Uint8' }, // INACTIVE / ACTIVE
+
+    // Primary
+    { name: 'chars', type: 'Uint16' },
+    { name: 'colors', type: 'Uint32' }, // 0xAABBGGRR - Current Display Color
+    { name: 'baseColors', type: 'Uint32' }, // 0xAABBGGRR - Target/Stream Color
+    { name: 'alphas', type: 'Float32' },
+    { name: 'glows', type: 'Float32' },
+    { name: 'fontIndices', type: 'Uint8' },
+
+    // Secondary
+    { name: 'secondaryChars', type: 'Uint16' },
+    { name: 'secondaryColors', type: 'Uint32' },
+    { name: 'secondaryAlphas', type: 'Float32' },
+    { name: 'secondaryGlows', type: 'Float32' },
+    { name: 'secondaryFontIndices', type: 'Uint8' },
+
+    // Mix / Mode
+    { name: 'mix', type: 'Float32' }, // 0.0 = Primary, 1.0 = Secondary
+    { name: 'renderMode', type: 'Uint8' }, // RENDER_MODE
+
+    // Override
+    { name: 'overrideActive', type: 'Uint8', clone: false }, // OVERRIDE_MODE
+    { name: 'overrideChars', type: 'Uint16', clone: false },
+    { name: 'overrideColors', type: 'Uint32', clone: false },
+    { name: 'overrideAlphas', type: 'Float32', clone: false },
+    { name: 'overrideGlows', type: 'Float32', clone: false },
+    { name: 'overrideMix', type: 'Float32', clone: false }, // For FULL mode
+    { name: 'overrideNextChars', type: 'Uint16', clone: false }, // For FULL mode rotators
+    { name: 'overrideFontIndices', type: 'Uint8', clone: false },
+
+    // Effects
+    { name: 'effectActive', type: 'Uint8', clone: false },
+    { name: 'effectChars', type: 'Uint16', clone: false },
+    { name: 'effectColors', type: 'Uint32', clone: false },
+    { name: 'effectAlphas', type: 'Float32', clone: false },
+    { name: 'effectFontIndices', type: 'Uint8', clone: false },
+    { name: 'effectGlows', type: 'Float32', clone: false },
+
+    // Simulation
+    { name: 'types', type: 'Uint8' }, // Tracer, Rotator, Empty
+    { name: 'decays', type: 'Uint16' },
+    { name: 'maxDecays', type: 'Uint16' }, // Per-cell fade duration
+    { name: 'ages', type: 'Int32' },
+    { name: 'brightness', type: 'Float32' },
+    { name: 'streamSeeds', type: 'Uint8' }, // For character-locked brightness
+    { name: 'rotatorOffsets', type: 'Uint8' }, // Static noise for desync
+    { name: 'cellLocks', type: 'Uint8' }, // Prevent updates
+
+    // Rotators
+    { name: 'nextChars', type: 'Uint16' },
+    { name: 'nextOverlapChars', type: 'Uint16' },
+
+    // Environmental Glows (Additive, per frame)
+    { name: 'envGlows', type: 'Float32', clone: false },
+
+    // Optimized Effects Data (4 floats per cell)
+    { name: 'genericParams', type: 'Float32', per: 4 }
+];
+
+// Field offsets are aligned to this many bytes
+const CELL_GRID_ALIGN = 16;
+
 class CellGrid {
     constructor(config) {
         this.config = config;
@@ -33,68 +105,50 @@ class CellGrid {
 
         // --- Core State ---
         this.activeIndices = new Set(); // Tracks active (non-empty) cells (Main Thread Only for sparse loops)
-        this.activeFlag = null; // Uint8: 0/1 (Shared for Worker consistency)
-        this.state = null; // Uint8: INACTIVE / ACTIVE
-
-        // --- Primary Layer ---
-        this.chars = null;        // Uint16
-        this.colors = null;       // Uint32 (0xAABBGGRR) - Current Display Color
-        this.baseColors = null;   // Uint32 (0xAABBGGRR) - Target/Stream Color
-        this.alphas = null;       // Float32
-        this.glows = null;        // Float32
-        this.fontIndices = null;  // Uint8
-
-        // --- Secondary Layer (Rotators / Overlaps) ---
-        this.secondaryChars = null; // Uint16
-        this.secondaryColors = null; // Uint32
-        this.secondaryAlphas = null; // Float32
-        this.secondaryGlows = null;  // Float32
-        this.secondaryFontIndices = null; // Uint8
-        
-        // --- Mixing & Rendering ---
-        this.mix = null;        // Float32 (0.0 = Primary, 1.0 = Secondary)
-        this.renderMode = null; // Uint8 (RENDER_MODE)
-
-        // --- Override Layer (Effects) ---
-        this.overrideActive = null; // Uint8 (OVERRIDE_MODE)
-        this.overrideChars = null;  // Uint16
-        this.overrideColors = null; // Uint32
-        this.overrideAlphas = null; // Float32
-        this.overrideGlows = null;  // Float32
-        this.overrideMix = null;    // Float32 (New: For FULL mode)
-        this.overrideNextChars = null; // Uint16 (New: For FULL mode rotators)
-        this.overrideFontIndices = null; // Uint8
-
-        // --- Passive Layer (Effects) ---
-        this.effectActive = null;   // Uint8
-        this.effectChars = null;    // Uint16
-        this.effectColors = null;   // Uint32
-        this.effectAlphas = null;   // Float32
-        this.effectGlows = null;    // Float32
-        this.effectFontIndices = null; // Uint8
-
-        // --- Simulation Logic Storage ---
-        this.types = null;      // Uint8 (Tracer, Rotator, Empty)
-        this.decays = null;     // Uint8
-        this.maxDecays = null;  // Uint16 (Per-cell fade duration)
-        this.ages = null;       // Int32
-        this.brightness = null; // Float32
-        this.streamSeeds = null; // Uint8 (New: For character-locked brightness)
-        this.rotatorOffsets = null; // Uint8 (Static noise for desync)
-        
-        // Auxiliary
-        this.cellLocks = null;  // Uint8 (Prevent updates)
         this.overrideOwner = null; // Ownership guard for overrides
-        
+
         // Sparse Data (Maps for memory efficiency)
         this.complexStyles = new Map(); // Dynamic styling data
-        
-        // Rotator Targets (Dense for GPU upload)
-        this.nextChars = null;     // Uint16Array
-        this.nextOverlapChars = null; // Uint16Array
 
-        // --- Optimized Effects Data ---
-        this.genericParams = null; // Float32Array (4 floats per cell)
+        // Dense per-cell typed arrays (see CELL_GRID_LAYOUT), created in _resizeGrid
+        for (let i = 0; i < CELL_GRID_LAYOUT.length; i++) this[CELL_GRID_LAYOUT[i].name] = null;
+
+        // Single backing store for every CELL_GRID_LAYOUT field (ArrayBuffer or SharedArrayBuffer)
+        this.buffer = null;
+    }
+
+    /**
+     * Computes byte offsets for every CELL_GRID_LAYOUT field for a grid of `total` cells.
+     * @param {number} total - Number of cells (cols * rows).
+     * @returns {{byteLength: number, fields: Array<{name: string, type: string, offset: number, length: number}>}}
+     */
+    static computeLayout(total) {
+        const fields = [];
+        let offset = 0;
+        for (let i = 0; i < CELL_GRID_LAYOUT.length; i++) {
+            const f = CELL_GRID_LAYOUT[i];
+            const length = total * (f.per || 1);
+            offset = Math.ceil(offset / CELL_GRID_ALIGN) * CELL_GRID_ALIGN;
+            fields.push({ name: f.name, type: f.type, offset, length });
+            offset += length * globalThis[f.type + 'Array'].BYTES_PER_ELEMENT;
+        }
+        return { byteLength: Math.ceil(offset / CELL_GRID_ALIGN) * CELL_GRID_ALIGN, fields };
+    }
+
+    /**
+     * Creates typed-array views for every CELL_GRID_LAYOUT field over a single buffer.
+     * @param {ArrayBuffer|SharedArrayBuffer} buffer - Backing store of at least computeLayout(total).byteLength bytes.
+     * @param {number} total - Number of cells (cols * rows).
+     * @returns {Object} Map of field name to typed array, plus `buffer`.
+     */
+    static createViews(buffer, total) {
+        const views = { buffer };
+        const layout = CellGrid.computeLayout(total);
+        for (let i = 0; i < layout.fields.length; i++) {
+            const f = layout.fields[i];
+            views[f.name] = new globalThis[f.type + 'Array'](buffer, f.offset, f.length);
+        }
+        return views;
     }
 
     /**
@@ -104,61 +158,27 @@ class CellGrid {
     copyFrom(other) {
         if (!other || other.cols !== this.cols || other.rows !== this.rows) return;
 
-        // --- Core State ---
         this.activeIndices = new Set(other.activeIndices);
-        if (this.activeFlag && other.activeFlag) this.activeFlag.set(other.activeFlag);
-        if (this.state && other.state) this.state.set(other.state);
-
-        // --- Primary Layer ---
-        if (this.chars && other.chars) this.chars.set(other.chars);
-        if (this.colors && other.colors) this.colors.set(other.colors);
-        if (this.baseColors && other.baseColors) this.baseColors.set(other.baseColors);
-        if (this.alphas && other.alphas) this.alphas.set(other.alphas);
-        if (this.glows && other.glows) this.glows.set(other.glows);
-        if (this.fontIndices && other.fontIndices) this.fontIndices.set(other.fontIndices);
-
-        // --- Secondary Layer ---
-        if (this.secondaryChars && other.secondaryChars) this.secondaryChars.set(other.secondaryChars);
-        if (this.secondaryColors && other.secondaryColors) this.secondaryColors.set(other.secondaryColors);
-        if (this.secondaryAlphas && other.secondaryAlphas) this.secondaryAlphas.set(other.secondaryAlphas);
-        if (this.secondaryGlows && other.secondaryGlows) this.secondaryGlows.set(other.secondaryGlows);
-        if (this.secondaryFontIndices && other.secondaryFontIndices) this.secondaryFontIndices.set(other.secondaryFontIndices);
-        
-        // --- Mixing & Rendering ---
-        if (this.mix && other.mix) this.mix.set(other.mix);
-        if (this.renderMode && other.renderMode) this.renderMode.set(other.renderMode);
-
-        // --- Simulation Logic Storage ---
-        if (this.types && other.types) this.types.set(other.types);
-        if (this.decays && other.decays) this.decays.set(other.decays);
-        if (this.maxDecays && other.maxDecays) this.maxDecays.set(other.maxDecays);
-        if (this.ages && other.ages) this.ages.set(other.ages);
-        if (this.brightness && other.brightness) this.brightness.set(other.brightness);
-        if (this.streamSeeds && other.streamSeeds) this.streamSeeds.set(other.streamSeeds);
-        if (this.rotatorOffsets && other.rotatorOffsets) this.rotatorOffsets.set(other.rotatorOffsets);
-        
-        // Auxiliary
-        if (this.cellLocks && other.cellLocks) this.cellLocks.set(other.cellLocks);
-        
+
+        // Dense layers (every CELL_GRID_LAYOUT field not marked clone: false)
+        for (let i = 0; i < CELL_GRID_LAYOUT.length; i++) {
+            const f = CELL_GRID_LAYOUT[i];
+            if (f.clone === false) continue;
+            if (this[f.name] && other[f.name]) this[f.name].set(other[f.name]);
+        }
+
         // Sparse Data
         this.complexStyles = new Map();
         for (const [key, value] of other.complexStyles) {
             // Deep clone style object if necessary, but usually they are small literals
             this.complexStyles.set(key, typeof value === 'object' ? { ...value } : value);
         }
-        
-        // Rotator Targets
-        if (this.nextChars && other.nextChars) this.nextChars.set(other.nextChars);
-        if (this.nextOverlapChars && other.nextOverlapChars) this.nextOverlapChars.set(other.nextOverlapChars);
-
-        // --- Optimized Effects Data ---
-        if (this.genericParams && other.genericParams) this.genericParams.set(other.genericParams);
     }
 
     /**
      * Resizes the grid based on new width and height.
      */
-    resize(width, height, buffers = null) {
+    resize(width, height, buffer = null) {
         const d = this.config.derived;
         if (!Number.isFinite(width) || !Number.isFinite(height) || width <= 0 || height <= 0) return;
         if (!d || !d.cellWidth || !d.cellHeight) return;
@@ -167,8 +187,8 @@ class CellGrid {
         const newCols = Math.round(width / d.cellWidth);
         const newRows = Math.ceil(height / d.cellHeight);
 
-        if (newCols !== this.cols || newRows !== this.rows || buffers) {
-            this._resizeGrid(newCols, newRows, buffers);
+        if (newCols !== this.cols || newRows !== this.rows || buffer) {
+            this._resizeGrid(newCols, newRows, buffer);
         }
     }
 
@@ -339,124 +359,20 @@ class CellGrid {
         return this.state[idx];
     }
 
-    _resizeGrid(newCols, newRows, buffers = null) {
+    _resizeGrid(newCols, newRows, buffer = null) {
         const total = newCols * newRows;
 
-        if (buffers) {
-            // Adopt provided buffers (SharedArrayBuffer views)
-            this.activeFlag = buffers.activeFlag;
-            this.state = buffers.state;
-            this.chars = buffers.chars;
-            this.colors = buffers.colors;
-            this.baseColors = buffers.baseColors;
-            this.alphas = buffers.alphas;
-            this.glows = buffers.glows;
-            this.fontIndices = buffers.fontIndices;
-
-            this.secondaryChars = buffers.secondaryChars;
-            this.secondaryColors = buffers.secondaryColors;
-            this.secondaryAlphas = buffers.secondaryAlphas;
-            this.secondaryGlows = buffers.secondaryGlows;
-            this.secondaryFontIndices = buffers.secondaryFontIndices;
-
-            this.mix = buffers.mix;
-            this.renderMode = buffers.renderMode;
-
-            this.overrideActive = buffers.overrideActive;
-            this.overrideChars = buffers.overrideChars;
-            this.overrideColors = buffers.overrideColors;
-            this.overrideAlphas = buffers.overrideAlphas;
-            this.overrideGlows = buffers.overrideGlows;
-            this.overrideMix = buffers.overrideMix;
-            this.overrideNextChars = buffers.overrideNextChars;
-            this.overrideFontIndices = buffers.overrideFontIndices;
-
-            this.effectActive = buffers.effectActive;
-            this.effectChars = buffers.effectChars;
-            this.effectColors = buffers.effectColors;
-            this.effectAlphas = buffers.effectAlphas;
-            this.effectFontIndices = buffers.effectFontIndices;
-            this.effectGlows = buffers.effectGlows;
-
-            this.types = buffers.types;
-            this.decays = buffers.decays;
-            this.maxDecays = buffers.maxDecays;
-            this.ages = buffers.ages;
-            this.brightness = buffers.brightness;
-            this.streamSeeds = buffers.streamSeeds;
-            this.rotatorOffsets = buffers.rotatorOffsets;
-            this.cellLocks = buffers.cellLocks;
-
-            this.nextChars = buffers.nextChars;
-            this.nextOverlapChars = buffers.nextOverlapChars;
-            this.envGlows = buffers.envGlows;
-            this.genericParams = buffers.genericParams;
-
-        } else {
-            // Core
-            this.activeFlag = new Uint8Array(total);
-            this.state = new Uint8Array(total);
-
-            // Primary
-            this.chars = new Uint16Array(total);
-            this.colors = new Uint32Array(total);
-            this.baseColors = new Uint32Array(total);
-            this.alphas = new Float32Array(total);
-            this.glows = new Float32Array(total);
-            this.fontIndices = new Uint8Array(total);
-
-            // Secondary
-            this.secondaryChars = new Uint16Array(total);
-            this.secondaryColors = new Uint32Array(total);
-            this.secondaryAlphas = new Float32Array(total);
-            this.secondaryGlows = new Float32Array(total);
-            this.secondaryFontIndices = new Uint8Array(total);
-
-            // Mix / Mode
-            this.mix = new Float32Array(total);
-            this.renderMode = new Uint8Array(total);
-
-            // Override
-            this.overrideActive = new Uint8Array(total);
-            this.overrideChars = new Uint16Array(total);
-            this.overrideColors = new Uint32Array(total);
-            this.overrideAlphas = new Float32Array(total);
-            this.overrideGlows = new Float32Array(total);
-            this.overrideMix = new Float32Array(total);
-            this.overrideNextChars = new Uint16Array(total);
-            this.overrideFontIndices = new Uint8Array(total);
-
-            // Effects
-            this.effectActive = new Uint8Array(total)
-            this.effectChars = new Uint16Array(total);
-            this.effectColors = new Uint32Array(total);
-            this.effectAlphas = new Float32Array(total);
-            this.effectFontIndices = new Uint8Array(total);
-            this.effectGlows = new Float32Array(total);
-
-            // Simulation
-            this.types = new Uint8Array(total);
-            this.decays = new Uint16Array(total);
-            this.maxDecays = new Uint16Array(total);
-            this.ages = new Int32Array(total);
-            this.brightness = new Float32Array(total);
-            this.streamSeeds = new Uint8Array(total);
-            this.rotatorOffsets = new Uint8Array(total);
-            this.cellLocks = new Uint8Array(total);
-            
-            // Rotators
-            this.nextChars = new Uint16Array(total);
-            this.nextOverlapChars = new Uint16Array(total);
-
-            // Environmental Glows (Additive, per frame)
-            this.envGlows = new Float32Array(total);
-
-            // Optimized Effects Data (4 floats per cell)
-            this.genericParams = new Float32Array(total * 4);
+        // Adopt a provided buffer (SharedArrayBuffer from SimulationSystem / Worker),
+        // otherwise allocate one ArrayBuffer holding every field.
+        const views = CellGrid.createViews(buffer || new ArrayBuffer(CellGrid.computeLayout(total).byteLength), total);
+        for (let i = 0; i < CELL_GRID_LAYOUT.length; i++) {
+            const name = CELL_GRID_LAYOUT[i].name;
+            this[name] = views[name];
         }
+        this.buffer = views.buffer;
 
         // Initialize static data
-        if (!buffers) {
+        if (!buffer) {
             const activeFonts = this.config.derived ? this.config.derived.activeFonts : null;
             const fallbackChars = "012345789Z:<=>\"*+-._!|";
             
@@ -10,7 +10,7 @@ class SimulationSystem {
         // --- Web Worker Support ---
         this.worker = null;
         this.useWorker = false;
-        this.workerBuffers = null; // Store current SABs
+        this.workerBuffer = null; // Store current SAB
 
         this.rotatorSpeedMap = new Float32Array(60);
         for (let i = 0; i < 60; i++) {
@@ -51,18 +51,18 @@ class SimulationSystem {
                 const rows = Math.ceil(height / d.cellHeight);
                 const total = cols * rows;
 
-                // 2. Allocate Shared Buffers
-                this.workerBuffers = this._createSharedBuffers(total);
+                // 2. Allocate Shared Buffer
+                this.workerBuffer = this._createSharedBuffer(total);
 
-                // 3. Resize Grid using Shared Buffers
-                originalResize(width, height, this.workerBuffers);
+                // 3. Resize Grid using Shared Buffer
+                originalResize(width, height, this.workerBuffer);
 
                 // 4. Update Worker
                 this.worker.postMessage({
                     type: 'resize',
                     width: width,
                     height: height,
-                    buffers: this.workerBuffers,
+                    buffer: this.workerBuffer,
                     config: {
                         state: this.config.state,
                         derived: this.config.derived 
@@ -136,69 +136,9 @@ class SimulationSystem {
         // which happens immediately in MatrixKernel.initAsync()
     }
 
-    _createSharedBuffers(total) {
-        // Helper to create a specific typed array view on a SAB
-        const createSAB = (bytes) => new SharedArrayBuffer(bytes);
-        
-        // Align to 4 bytes for safety/performance
-        const uint8Size = total;
-        const uint16Size = total * 2;
-        const uint32Size = total * 4;
-        const float32Size = total * 4;
-        const int32Size = total * 4;
-
-        const buffers = {
-            activeFlag: new Uint8Array(createSAB(uint8Size)),
-            state: new Uint8Array(createSAB(uint8Size)),
-            
-            chars: new Uint16Array(createSAB(uint16Size)),
-            colors: new Uint32Array(createSAB(uint32Size)),
-            baseColors: new Uint32Array(createSAB(uint32Size)),
-            alphas: new Float32Array(createSAB(float32Size)),
-            glows: new Float32Array(createSAB(float32Size)),
-            fontIndices: new Uint8Array(createSAB(uint8Size)),
-
-            secondaryChars: new Uint16Array(createSAB(uint16Size)),
-            secondaryColors: new Uint32Array(createSAB(uint32Size)),
-            secondaryAlphas: new Float32Array(createSAB(float32Size)),
-            secondaryGlows: new Float32Array(createSAB(float32Size)),
-            secondaryFontIndices: new Uint8Array(createSAB(uint8Size)),
-
-            mix: new Float32Array(createSAB(float32Size)),
-            renderMode: new Uint8Array(createSAB(uint8Size)),
-
-            overrideActive: new Uint8Array(createSAB(uint8Size)),
-            overrideChars: new Uint16Array(createSAB(uint16Size)),
-            overrideColors: new Uint32Array(createSAB(uint32Size)),
-            overrideAlphas: new Float32Array(createSAB(float32Size)),
-            overrideGlows: new Float32Array(createSAB(float32Size)),
-            overrideMix: new Float32Array(createSAB(float32Size)),
-            overrideNextChars: new Uint16Array(createSAB(uint16Size)),
-            overrideFontIndices: new Uint8Array(createSAB(uint8Size)),
-
-            effectActive: new Uint8Array(createSAB(uint8Size)),
-            effectChars: new Uint16Array(createSAB(uint16Size)),
-            effectColors: new Uint32Array(createSAB(uint32Size)),
-            effectAlphas: new Float32Array(createSAB(float32Size)),
-            effectFontIndices: new Uint8Array(createSAB(uint8Size)),
-            effectGlows: new Float32Array(createSAB(float32Size)),
-
-            types: new Uint8Array(createSAB(uint8Size)),
-            decays: new Uint16Array(createSAB(uint16Size)),
-            maxDecays: new Uint16Array(createSAB(uint16Size)),
-            ages: new Int32Array(createSAB(int32Size)),
-            brightness: new Float32Array(createSAB(float32Size)),
-            streamSeeds: new Uint8Array(createSAB(uint8Size)),
-            rotatorOffsets: new Uint8Array(createSAB(uint8Size)),
-            cellLocks: new Uint8Array(createSAB(uint8Size)),
-
-            nextChars: new Uint16Array(createSAB(uint16Size)),
-            nextOverlapChars: new Uint16Array(createSAB(uint16Size)),
-            envGlows: new Float32Array(createSAB(float32Size)),
-            genericParams: new Float32Array(createSAB(float32Size * 4))
-        };
-        
-        return buffers;
+    _createSharedBuffer(total) {
+        // One SharedArrayBuffer holding every CellGrid field (see CELL_GRID_LAYOUT)
+        return new SharedArrayBuffer(CellGrid.computeLayout(total).byteLength);
     }
 
     /**
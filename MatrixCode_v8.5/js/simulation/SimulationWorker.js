@@ -334,7 +334,7 @@ self.onmessage = function(e) {
         case 'init':
             config.state = msg.config.state; config.derived = msg.config.derived;
             grid = new CellGrid(configManagerMock);
-            grid.resize(msg.width, msg.height, msg.buffers);
+            grid.resize(msg.width, msg.height, msg.buffer);
             simSystem = new WorkerSimulationSystem(grid, configManagerMock);
             break;
         case 'config':
@@ -350,7 +350,7 @@ self.onmessage = function(e) {
         case 'resize':
             if (grid) {
                 config.state = msg.config.state; config.derived = msg.config.derived;
-                grid.resize(msg.width, msg.height, msg.buffers);
+                grid.resize(msg.width, msg.height, msg.buffer);
                 if (simSystem) simSystem.streamManager.resize(grid.cols);
             }
             break;
@@ -3,9 +3,15 @@ import re
 import sys
 import argparse
 import glob
+import math
 import base64
+import bisect
 import json
+import time
+import tracemalloc
 from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
 
 # --- Configuration ---
 
@@ -76,11 +82,182 @@ FORCED_LAST = [
     'js/core/MatrixKernel.js'
 ]
 
+# Entry point of the boot script; everything it reaches is on the critical path
+BOOT_ENTRY = 'js/core/MatrixKernel.js'
+
+# Modules the kernel can do without until after the first frame (UI is created by
+# MatrixKernel._initializeUI, patterns are read lazily). References to these do not
+# pull them onto the critical path; subclassing them still does.
+LAZY_MODULES = [
+    'js/ui/UIManager.js',
+    'js/ui/CharacterSelectorModal.js',
+    'js/ui/QuantizedEffectEditor.js',
+    'js/effects/QuantizedPatterns.js'
+]
+
+# Shared GLSL chunks referenced via `#include "name.glsl"` live here (relative to shaders/)
+SHADER_INCLUDE_DIR = 'include'
+SHADER_INCLUDE_PATTERN = re.compile(r'^[ \t]*#include\s+["<]([^">]+)[">][ \t]*$')
+
+# Per-cell simulation storage is declared once in CellGrid.js (CELL_GRID_LAYOUT and
+# CELL_GRID_ALIGN); the size calculator below parses it and mirrors CellGrid.computeLayout.
+CELL_GRID_FILE = 'js/data/CellGrid.js'
+TYPED_ARRAY_BYTES = {'Int8': 1, 'Uint8': 1, 'Int16': 2, 'Uint16': 2, 'Int32': 4, 'Uint32': 4, 'Float32': 4, 'Float64': 8}
+
+# Capacity model (`capacity` command). Renderer-side costs mirrored from the JS sources.
+CAPACITY_DISPLAYS = ['1920x1080', '2560x1440', '3840x2160', '5760x1080', '7680x2160', '7680x4320']
+CAPACITY_PRESETS_GLOB = 'presets/*Presets*.json'
+# Settings the model reads, with ConfigurationManager defaults for presets that omit them
+CAPACITY_SETTINGS = {'fontSize': 22, 'resolution': 1, 'horizontalSpacingFactor': 0.95, 'verticalSpacingFactor': 0.95,
+                     'stretchX': 1, 'stretchY': 1, 'tracerSizeIncrease': 1}
+CAPACITY_POSITIVE_SETTINGS = {'fontSize', 'resolution', 'horizontalSpacingFactor', 'verticalSpacingFactor', 'stretchX', 'stretchY'}
+GRID_WORLDS = 2              # MatrixKernel keeps a primary and a shadow world, each with its own CellGrid
+INSTANCE_STRIDE = 40         # WebGLRenderer interleaved instance buffer, re-uploaded every frame
+POSITION_STRIDE = 8          # WebGLRenderer static position buffer (uploaded on resize)
+FBO_FULL_RES = 10            # WebGLRenderer (7) + PostProcessor (3) render-resolution targets
+FBO_HALF_RES = 2             # WebGLRenderer bloom targets
+FBO_BYTES_PER_PIXEL = 8      # RGBA16F when float targets are available
+ATLAS_TARGET_WIDTH = 2048    # GlyphAtlas fixed-width layout
+ATLAS_MAX_HEIGHT = 8192
+ATLAS_MIN_CAPACITY = 256
+ATLAS_PADDING = 20
+
 def ensure_dir(file_path):
     directory = os.path.dirname(file_path)
     if directory and not os.path.exists(directory):
         os.makedirs(directory)
 
+# --- Build Profiling ---
+
+class BuildProfiler:
+    """
+    Records wall time per build stage, plus input/output bytes per asset, for the
+    --profile flag. With trace_memory (--profile-memory) it also records peak
+    tracemalloc memory per stage; tracing slows allocation-heavy stages, so those
+    timings are only comparable with each other. A disabled profiler is a no-op so
+    build functions can always call stage()/record().
+    """
+    def __init__(self, command, enabled=True, trace_memory=False):
+        self.command = command
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages = {}
+        self.assets = defaultdict(dict)
+        self.metrics = {}
+        self.output = None
+        self._started = None
+        self._peak = 0
+
+    def start(self):
+        if not self.enabled: return
+        if self.trace_memory: tracemalloc.start()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+        else:
+            base = 0
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            _, peak = tracemalloc.get_traced_memory() if self.trace_memory else (0, 0)
+            self._peak = max(self._peak, peak)
+            # Repeated stages (e.g. several 'read' passes) accumulate time and keep the highest peak
+            entry = self.stages.setdefault(name, {'wall_ms': 0.0, 'peak_mem_bytes': 0, 'peak_mem_delta_bytes': 0})
+            entry['wall_ms'] += elapsed_ms
+            entry['peak_mem_bytes'] = max(entry['peak_mem_bytes'], peak)
+            entry['peak_mem_delta_bytes'] = max(entry['peak_mem_delta_bytes'], peak - base)
+
+    def record(self, category, name, input_bytes, output_bytes):
+        if not self.enabled: return
+        self.assets[category][name] = {'input_bytes': input_bytes, 'output_bytes': output_bytes}
+
+    def record_metric(self, name, value):
+        if not self.enabled: return
+        self.metrics[name] = value
+
+    def record_output(self, path):
+        if not self.enabled: return
+        self.output = {'path': path, 'bytes': os.path.getsize(path) if os.path.exists(path) else 0}
+
+    def report(self, top=10):
+        categories = {}
+        contributors = []
+        for cat, items in self.assets.items():
+            categories[cat] = {
+                'count': len(items),
+                'input_bytes': sum(i['input_bytes'] for i in items.values()),
+                'output_bytes': sum(i['output_bytes'] for i in items.values())
+            }
+            contributors.extend({'category': cat, 'name': n, **i} for n, i in items.items())
+        total_out = sum(c['output_bytes'] for c in categories.values()) or 1
+        contributors.sort(key=lambda c: c['output_bytes'], reverse=True)
+        for c in contributors: c['share'] = round(c['output_bytes'] / total_out, 4)
+
+        return {
+            'command': self.command,
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'total_wall_ms': round((time.perf_counter() - self._started) * 1000, 3) if self._started else 0.0,
+            'memory_traced': self.trace_memory,
+            # Stages reset tracemalloc's peak, so the overall peak is tracked separately
+            'peak_mem_bytes': max(self._peak, tracemalloc.get_traced_memory()[1]) if self.trace_memory else None,
+            'stages': [{'stage': n, 'wall_ms': round(e['wall_ms'], 3)} | ({'peak_mem_bytes': e['peak_mem_bytes'], 'peak_mem_delta_bytes': e['peak_mem_delta_bytes']} if self.trace_memory else {}) for n, e in self.stages.items()],
+            'categories': categories,
+            'assets': {cat: dict(items) for cat, items in self.assets.items()},
+            'top_contributors': contributors[:top],
+            'metrics': self.metrics,
+            'output': self.output
+        }
+
+    def finish(self, report_path):
+        if not self.enabled: return
+        report = self.report()
+        if self.trace_memory: tracemalloc.stop()
+        ensure_dir(report_path)
+        with open(report_path, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2)
+        print_profile_summary(report)
+        print(f"Profile report written: {report_path}")
+
+NULL_PROFILER = BuildProfiler(None, enabled=False)
+
+def utf8_len(text):
+    return len(text.encode('utf-8'))
+
+def format_bytes(n):
+    if n < 1024: return f"{n} B"
+    if n < 1024 * 1024: return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.2f} MB"
+
+def print_profile_summary(report):
+    traced = report['memory_traced']
+    if traced:
+        print(f"\n[Profile] {report['command']} - {report['total_wall_ms']:.1f} ms total, peak traced memory {format_bytes(report['peak_mem_bytes'])}")
+        print("  (timings include tracemalloc overhead; profile without --profile-memory for real times)")
+    else:
+        print(f"\n[Profile] {report['command']} - {report['total_wall_ms']:.1f} ms total (memory not traced; add --profile-memory)")
+    print(f"  {'Stage':<18}{'Time (ms)':>12}" + (f"{'Peak mem':>12}" if traced else ""))
+    for st in report['stages']:
+        print(f"  {st['stage']:<18}{st['wall_ms']:>12.1f}" + (f"{format_bytes(st['peak_mem_bytes']):>12}" if traced else ""))
+    if report['categories']:
+        print(f"\n  {'Category':<18}{'Count':>7}{'Input':>12}{'Output':>12}")
+        for cat, c in sorted(report['categories'].items(), key=lambda kv: kv[1]['output_bytes'], reverse=True):
+            print(f"  {cat:<18}{c['count']:>7}{format_bytes(c['input_bytes']):>12}{format_bytes(c['output_bytes']):>12}")
+    if report['top_contributors']:
+        print("\n  Top contributors (output bytes):")
+        for c in report['top_contributors']:
+            print(f"  {c['share'] * 100:>6.1f}%  {format_bytes(c['output_bytes']):>10}  {c['category']}: {c['name']}")
+    if report['output']:
+        print(f"\n  Output: {report['output']['path']} ({format_bytes(report['output']['bytes'])})")
+    print()
+
 def scan_file_content(content):
     defined_classes = set()
     dependencies = set()
@@ -93,9 +270,12 @@ def scan_file_content(content):
             dependencies.add(parent_name)
     return defined_classes, dependencies
 
-def get_dependency_order(source_dir):
+def scan_source_files(source_dir):
+    """
+    Walks the project's js/ tree and returns {rel_path: {'defs', 'deps', 'names'}}
+    for every browser module (main process, worker and tools are excluded).
+    """
     files_data = {}
-    all_files = []
     
     # Strictly target the 'js' subdirectory to avoid node_modules and other root files
     actual_js_path = os.path.join(source_dir, 'js')
@@ -128,9 +308,51 @@ def get_dependency_order(source_dir):
                     continue
 
                 defs, deps = scan_file_content(content)
-                files_data[rel_path] = {'defs': defs, 'deps': deps}
-                all_files.append(rel_path)
+                files_data[rel_path] = {'defs': defs, 'deps': deps, 'names': scan_module_names(content)}
+
+    return files_data
+
+def scan_module_names(content):
+    """
+    Returns the global names a module exposes: top-level classes and capitalised
+    const/let/var/function declarations, plus window.X assignments. Lower-case
+    top-level helpers are treated as private to the module.
+    """
+    names = set(re.findall(r'^(?:class|const|let|var|function)\s+([A-Z]\w*)', content, re.MULTILINE))
+    names.update(re.findall(r'^window\.(\w+)\s*=', content, re.MULTILINE))
+    return names
+
+def compute_critical_path(source_dir, files_data, entry=BOOT_ENTRY, lazy=LAZY_MODULES):
+    """
+    Returns the set of modules reachable from entry through global-name references
+    (and `extends`). Edges into lazy modules are skipped unless they are `extends`
+    edges, since a subclass cannot be evaluated before its parent. Modules are
+    read one at a time as they are reached.
+    """
+    if entry not in files_data: return set(files_data)
+
+    name_to_file = {}
+    for rel_path, data in files_data.items():
+        for name in data['names']: name_to_file.setdefault(name, rel_path)
+    token_pattern = re.compile(r'[A-Za-z_$][\w$]*')
 
+    critical = {entry}
+    queue = [entry]
+    while queue:
+        u = queue.pop()
+        parents = {name_to_file.get(cls) for cls in files_data[u]['deps']}
+        with open(os.path.join(source_dir, u), 'r', encoding='utf-8') as f:
+            refs = {m.group() for m in token_pattern.finditer(f.read())} & name_to_file.keys()
+        for name in refs:
+            v = name_to_file.get(name)
+            if not v or v == u or v in critical: continue
+            if v in lazy and v not in parents: continue
+            critical.add(v); queue.append(v)
+    return critical
+
+def order_source_files(files_data):
+    """Topologically sorts scanned modules (parents before subclasses) and applies FORCED_FIRST/FORCED_LAST."""
+    all_files = list(files_data)
     class_to_file = {}
     for f, data in files_data.items():
         for cls in data['defs']:
@@ -183,6 +405,27 @@ def get_dependency_order(source_dir):
     
     return final_list
 
+def get_dependency_order(source_dir, profiler=None):
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage('scan'):
+        files_data = scan_source_files(source_dir)
+    with profiler.stage('order'):
+        return order_source_files(files_data)
+
+def get_boot_split(source_dir, profiler=None):
+    """
+    Returns (boot, deferred): the dependency-ordered modules needed to reach the
+    first MatrixKernel frame, and the remaining modules in the same order.
+    """
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage('scan'):
+        files_data = scan_source_files(source_dir)
+    with profiler.stage('order'):
+        load_order = order_source_files(files_data)
+    with profiler.stage('critical path'):
+        critical = compute_critical_path(source_dir, files_data)
+    return [f for f in load_order if f in critical], [f for f in load_order if f not in critical]
+
 def identify_target_file(block_content, current_hint=None):
     # Check for direct class or const matches in CODE_MAP
     for key, path in CODE_MAP.items():
@@ -205,113 +448,125 @@ def identify_target_file(block_content, current_hint=None):
         
     return current_hint or "js/core/Utils.js"
 
-def split_monolith(input_file, output_dir):
+def split_monolith(input_file, output_dir, profiler=None):
+    profiler = profiler or NULL_PROFILER
     print(f"Splitting {input_file} into {output_dir}...")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    css_match = re.search(r'<style>(.*?)</style>', content, re.DOTALL)
-    if css_match:
-        css_path = os.path.join(output_dir, 'css/style.css')
-        ensure_dir(css_path)
-        with open(css_path, 'w', encoding='utf-8') as f: f.write(css_match.group(1).strip())
-
-    shader_matches = re.finditer(r'<script type="x-shader/x-fragment" id="(.*?)">[\s]*([\s\S]*?)[\s]*</script>', content)
-    for match in shader_matches:
-        s_id, s_content = match.groups()
-        s_path = os.path.join(output_dir, 'shaders', s_id)
-        ensure_dir(s_path)
-        with open(s_path, 'w', encoding='utf-8') as f: f.write(s_content)
-
-    preset_matches = re.finditer(r'<script type="application/json" id="(.*?)">[\s]*([\s\S]*?)[\s]*</script>', content)
-    for match in preset_matches:
-        p_id, p_content = match.groups()
-        p_path = os.path.join(output_dir, 'presets', p_id)
-        ensure_dir(p_path)
-        with open(p_path, 'w', encoding='utf-8') as f: f.write(p_content)
-
-    script_matches = re.finditer(r'<script(?: type="text/javascript")?>[\s]*([\s\S]*?)[\s]*</script>', content)
-    full_js = ""
-    for match in script_matches:
-        js_chunk = match.group(1)
-        if any(kw in js_chunk for kw in ["class ", "function ", "const "]): full_js += js_chunk + "\n"
-    
-    if full_js:
-        # 1. Try splitting by explicit file markers
-        parts = re.split(r'// --- ([a-zA-Z0-9_/\\.]+\.js) ---\n', full_js)
+    with profiler.stage('read'):
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+    with profiler.stage('extract assets'):
+        css_match = re.search(r'<style>(.*?)</style>', content, re.DOTALL)
+        if css_match:
+            css_path = os.path.join(output_dir, 'css/style.css')
+            ensure_dir(css_path)
+            with open(css_path, 'w', encoding='utf-8') as f: f.write(css_match.group(1).strip())
+            profiler.record('css', 'style.css', utf8_len(css_match.group(0)), os.path.getsize(css_path))
+
+        shader_matches = re.finditer(r'<script type="x-shader/x-fragment" id="(.*?)">[\s]*([\s\S]*?)[\s]*</script>', content)
+        for match in shader_matches:
+            s_id, s_content = match.groups()
+            s_path = os.path.join(output_dir, 'shaders', s_id)
+            ensure_dir(s_path)
+            with open(s_path, 'w', encoding='utf-8') as f: f.write(s_content)
+            profiler.record('shaders', s_id, utf8_len(match.group(0)), os.path.getsize(s_path))
+
+        preset_matches = re.finditer(r'<script type="application/json" id="(.*?)">[\s]*([\s\S]*?)[\s]*</script>', content)
+        for match in preset_matches:
+            p_id, p_content = match.groups()
+            p_path = os.path.join(output_dir, 'presets', p_id)
+            ensure_dir(p_path)
+            with open(p_path, 'w', encoding='utf-8') as f: f.write(p_content)
+            profiler.record('presets', p_id, utf8_len(match.group(0)), os.path.getsize(p_path))
+
+    with profiler.stage('split modules'):
+        script_matches = re.finditer(r'<script(?: type="(text/javascript|javascript/deferred)")?(?: data-module="([^"]*)")?>[\s]*([\s\S]*?)[\s]*</script>', content)
+        full_js = ""
         files_to_write = defaultdict(str)
+        for match in script_matches:
+            script_type, module_path, js_chunk = match.groups()
+            if script_type == 'javascript/deferred':
+                # Deferred chunks (code-split release) are always kept; data-module names the file
+                if module_path: files_to_write[module_path] += re.sub(r'^// --- [^\n]*? ---\n', '', js_chunk)
+                else: full_js += js_chunk + "\n"
+            elif any(kw in js_chunk for kw in ["class ", "function ", "const "]): full_js += js_chunk + "\n"
+    
+        if full_js:
+            # 1. Try splitting by explicit file markers
+            parts = re.split(r'// --- ([a-zA-Z0-9_/\\.]+\.js) ---\n', full_js)
         
-        if len(parts) > 1:
-            if parts[0].strip(): files_to_write['js/core/Utils.js'] += parts[0]
-            for i in range(1, len(parts), 2):
-                fname = parts[i].strip().replace('\\', '/')
-                if not fname.startswith('js/'):
-                    found = False
-                    for known in CODE_MAP.values():
-                        if os.path.basename(known) == fname: fname = known; found = True; break
-                    if not found:
-                        if 'Effect' in fname: fname = f"js/effects/{fname}"
-                        elif 'Manager' in fname: fname = f"js/ui/{fname}"
-                        else: fname = f"js/core/{fname}"
-                files_to_write[fname] += parts[i+1]
+            if len(parts) > 1:
+                if parts[0].strip(): files_to_write['js/core/Utils.js'] += parts[0]
+                for i in range(1, len(parts), 2):
+                    fname = parts[i].strip().replace('\\', '/')
+                    if not fname.startswith('js/'):
+                        found = False
+                        for known in CODE_MAP.values():
+                            if os.path.basename(known) == fname: fname = known; found = True; break
+                        if not found:
+                            if 'Effect' in fname: fname = f"js/effects/{fname}"
+                            elif 'Manager' in fname: fname = f"js/ui/{fname}"
+                            else: fname = f"js/core/{fname}"
+                    files_to_write[fname] += parts[i+1]
         
-        # 2. Try splitting by Semantic Class Headers (// === NAME ===)
-        else:
-            # Regex for: // ====... \n // NAME \n // ====...
-            # We capture the Name to help identify, and the content until the next match
-            header_pattern = r'//\s*=+\s*\n//\s*([A-Z0-9 _\-]+?)\s*\n//\s*=+\s*\n'
+            # 2. Try splitting by Semantic Class Headers (// === NAME ===)
+            else:
+                # Regex for: // ====... \n // NAME \n // ====...
+                # We capture the Name to help identify, and the content until the next match
+                header_pattern = r'//\s*=+\s*\n//\s*([A-Z0-9 _\-]+?)\s*\n//\s*=+\s*\n'
             
-            # Check if headers exist
-            if re.search(header_pattern, full_js, re.MULTILINE):
-                print("  - Detected Semantic Class Headers. Splitting by headers...")
-                # Split and keep delimiters
-                # re.split with capturing group returns [preamble, name1, content1, name2, content2, ...]
-                header_parts = re.split(header_pattern, full_js, flags=re.MULTILINE)
+                # Check if headers exist
+                if re.search(header_pattern, full_js, re.MULTILINE):
+                    print("  - Detected Semantic Class Headers. Splitting by headers...")
+                    # Split and keep delimiters
+                    # re.split with capturing group returns [preamble, name1, content1, name2, content2, ...]
+                    header_parts = re.split(header_pattern, full_js, flags=re.MULTILINE)
                 
-                # header_parts[0] is content before the first header (likely utils/globals)
-                if header_parts[0].strip():
-                    files_to_write['js/core/Utils.js'] += header_parts[0]
+                    # header_parts[0] is content before the first header (likely utils/globals)
+                    if header_parts[0].strip():
+                        files_to_write['js/core/Utils.js'] += header_parts[0]
                 
-                for i in range(1, len(header_parts), 2):
-                    section_name = header_parts[i].strip() # e.g. "MATRIX KERNEL"
-                    section_content = header_parts[i+1]
+                    for i in range(1, len(header_parts), 2):
+                        section_name = header_parts[i].strip() # e.g. "MATRIX KERNEL"
+                        section_content = header_parts[i+1]
                     
-                    # Reconstruct the header for the file content
-                    full_block = f"// =========================================================================\n// {section_name}\n// =========================================================================\n{section_content}"
+                        # Reconstruct the header for the file content
+                        full_block = f"// =========================================================================\n// {section_name}\n// =========================================================================\n{section_content}"
                     
-                    # Identify target file based on the content (looking for class X)
-                    # We pass the content without the header to identify_target_file, or just use the block
-                    target_file = identify_target_file(section_content)
+                        # Identify target file based on the content (looking for class X)
+                        # We pass the content without the header to identify_target_file, or just use the block
+                        target_file = identify_target_file(section_content)
                     
-                    # Fallback mapping if identify returns default but we have a strong hint from section_name
-                    if target_file == "js/core/Utils.js":
-                         # Heuristics for "MATRIX KERNEL" -> MatrixKernel
-                         # "WEBGL RENDERER" -> WebGLRenderer
-                         # "SIMULATION SYSTEM" -> SimulationSystem
-                         pass 
+                        # Fallback mapping if identify returns default but we have a strong hint from section_name
+                        if target_file == "js/core/Utils.js":
+                             # Heuristics for "MATRIX KERNEL" -> MatrixKernel
+                             # "WEBGL RENDERER" -> WebGLRenderer
+                             # "SIMULATION SYSTEM" -> SimulationSystem
+                             pass 
                          
-                    files_to_write[target_file] += full_block
+                        files_to_write[target_file] += full_block
 
-            # 3. Fallback to line-by-line scanning (Legacy)
-            else:
-                lines = full_js.split('\n'); current_file = 'js/core/Utils.js'; buffer = []
-                for line in lines:
-                    if line.strip().startswith(('class ', 'const ')):
-                         temp_target = identify_target_file(line)
-                         if temp_target and temp_target != current_file:
-                             if buffer: files_to_write[current_file] += '\n'.join(buffer) + '\n'
-                             buffer = []; current_file = temp_target
-                    buffer.append(line)
-                if buffer: files_to_write[current_file] += '\n'.join(buffer)
+                # 3. Fallback to line-by-line scanning (Legacy)
+                else:
+                    lines = full_js.split('\n'); current_file = 'js/core/Utils.js'; buffer = []
+                    for line in lines:
+                        if line.strip().startswith(('class ', 'const ')):
+                             temp_target = identify_target_file(line)
+                             if temp_target and temp_target != current_file:
+                                 if buffer: files_to_write[current_file] += '\n'.join(buffer) + '\n'
+                                 buffer = []; current_file = temp_target
+                        buffer.append(line)
+                    if buffer: files_to_write[current_file] += '\n'.join(buffer)
 
         for fpath, fcontent in files_to_write.items():
             full_path = os.path.join(output_dir, fpath)
             ensure_dir(full_path)
             with open(full_path, 'w', encoding='utf-8') as f: f.write(fcontent.strip() + '\n')
+            profiler.record('js modules', fpath, utf8_len(fcontent), os.path.getsize(full_path))
             
     body_match = re.search(r'<body.*?>(.*?)</body>', content, re.DOTALL)
     body_content = re.sub(r'<script.*?>.*?</script>', '', body_match.group(1), flags=re.DOTALL).strip() if body_match else ""
-    load_order = get_dependency_order(output_dir)
+    load_order = get_dependency_order(output_dir, profiler)
     
     scripts_html = "".join([f'    <script src="{s}"></script>\n' for s in load_order])
     dev_html = f"""<!DOCTYPE html>
@@ -327,7 +582,283 @@ def split_monolith(input_file, output_dir):
 {scripts_html}
 </body>
 </html>"""
-    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f: f.write(dev_html)
+    with profiler.stage('write'):
+        with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f: f.write(dev_html)
+    profiler.record_output(os.path.join(output_dir, 'index.html'))
+
+# --- Shader Library ---
+
+def expand_shader_includes(source, include_dir, stack=None, included=None):
+    """
+    Splits a shader into blocks (paragraphs separated by blank lines) and resolves
+    `#include "chunk.glsl"` lines against include_dir. Returns a list of
+    ('include', name) and ('text', block) entries. Each chunk is included at most
+    once per shader (include guard) and cycles abort the build.
+    """
+    stack = stack or []
+    included = included if included is not None else set()
+    entries = []
+    block = []
+
+    def flush():
+        text = '\n'.join(block).strip('\n')
+        if text.strip(): entries.append(('text', text))
+        block.clear()
+
+    for line in source.replace('\r\n', '\n').split('\n'):
+        inc = SHADER_INCLUDE_PATTERN.match(line)
+        if inc:
+            flush()
+            name = inc.group(1).strip().replace('\\', '/')
+            if name in stack:
+                print(f"\n[ERROR] Circular shader include: {' -> '.join(stack + [name])}")
+                sys.exit(1)
+            if name in included: continue
+            chunk_path = os.path.join(include_dir, name)
+            if not os.path.exists(chunk_path):
+                print(f"\n[ERROR] Shader include not found: {name} (looked in {include_dir})")
+                sys.exit(1)
+            included.add(name)
+            with open(chunk_path, 'r', encoding='utf-8') as f: chunk_src = f.read()
+            # Chunks that include other chunks are flattened; plain chunks stay as one reference
+            if any(SHADER_INCLUDE_PATTERN.match(l) for l in chunk_src.split('\n')):
+                entries.extend(expand_shader_includes(chunk_src, include_dir, stack + [name], included))
+            else:
+                entries.append(('include', name))
+        elif line.strip():
+            block.append(line.rstrip())
+        else:
+            flush()
+    flush()
+    return entries
+
+def build_shader_library(shaders_dir):
+    """
+    Builds the embedded shader library: every shared chunk is stored once in
+    'chunks' and each shader is a list of parts, where an integer is an index into
+    'chunks' and a string is a block unique to that shader. Blocks that appear
+    verbatim in more than one shader (common headers, uniform boilerplate, helper
+    functions) are promoted to chunks alongside explicit `#include` chunks.
+    Parts are rejoined with a blank line between them.
+    """
+    include_dir = os.path.join(shaders_dir, SHADER_INCLUDE_DIR)
+    expanded = {}
+    for s_file in sorted(os.listdir(shaders_dir)):
+        if s_file.endswith(('.glsl', '.frag', '.vert')):
+            with open(os.path.join(shaders_dir, s_file), 'r', encoding='utf-8') as f:
+                expanded[s_file] = expand_shader_includes(f.read(), include_dir)
+
+    block_usage = defaultdict(int)
+    for entries in expanded.values():
+        for kind, value in entries:
+            if kind == 'text': block_usage[value] += 1
+
+    chunks = []
+    chunk_index = {}
+
+    def chunk_ref(key, text):
+        if key not in chunk_index:
+            chunk_index[key] = len(chunks)
+            chunks.append(text)
+        return chunk_index[key]
+
+    shaders = {}
+    for s_file, entries in expanded.items():
+        parts = []
+        for kind, value in entries:
+            if kind == 'include':
+                with open(os.path.join(include_dir, value), 'r', encoding='utf-8') as f:
+                    parts.append(chunk_ref(('include', value), f.read().strip('\n')))
+            elif block_usage[value] > 1:
+                parts.append(chunk_ref(('text', value), value))
+            else:
+                parts.append(value)
+        shaders[s_file] = parts
+
+    return {'chunks': chunks, 'shaders': shaders}
+
+# --- Grid Layout ---
+
+def read_cell_grid_layout(source_dir):
+    """
+    Parses CELL_GRID_LAYOUT and CELL_GRID_ALIGN from CellGrid.js. Returns
+    (fields, align) where fields is a list of {'name', 'type', 'per'}. Any table
+    entry that cannot be read aborts, so sizes are never silently under-reported.
+    """
+    path = os.path.join(source_dir, CELL_GRID_FILE)
+    if not os.path.exists(path):
+        print(f"Error: {path} not found.")
+        sys.exit(1)
+    with open(path, 'r', encoding='utf-8') as f: content = f.read()
+    m = re.search(r'const\s+CELL_GRID_LAYOUT\s*=\s*\[(.*?)\n\];', content, re.DOTALL)
+    align = re.search(r'const\s+CELL_GRID_ALIGN\s*=\s*(\d+)\s*;', content)
+    if not m or not align:
+        print(f"Error: CELL_GRID_LAYOUT / CELL_GRID_ALIGN not found in {path}.")
+        sys.exit(1)
+    table = re.sub(r'//[^\n]*', '', m.group(1))
+    entries = re.findall(r'\{([^{}]*)\}', table)
+    fields = []
+    for entry in entries:
+        props = {k: v1 or v2 or v3 for k, v1, v2, v3 in
+                 re.findall(r'(\w+)\s*:\s*(?:\'([^\']*)\'|"([^"]*)"|(\d+|true|false))', entry)}
+        name, typ = props.get('name'), props.get('type')
+        if not name or typ not in TYPED_ARRAY_BYTES or not str(props.get('per', '1')).isdigit():
+            print(f"Error: Cannot parse CELL_GRID_LAYOUT entry {{{entry.strip()}}} in {path}.")
+            sys.exit(1)
+        fields.append({'name': name, 'type': typ, 'per': int(props.get('per', 1))})
+    if len(fields) != table.count('{'):
+        print(f"Error: Parsed {len(fields)} of {table.count('{')} CELL_GRID_LAYOUT entries in {path}.")
+        sys.exit(1)
+    return fields, int(align.group(1))
+
+def compute_grid_layout(fields, total, align):
+    """
+    Python mirror of CellGrid.computeLayout: byte offset/length of every field for
+    `total` cells, each offset aligned to `align` bytes. Returns (byte_length, entries).
+    """
+    round_up = lambda n: -(-n // align) * align
+    entries = []
+    offset = 0
+    for f in fields:
+        offset = round_up(offset)
+        length = total * f['per']
+        size = length * TYPED_ARRAY_BYTES[f['type']]
+        entries.append({'name': f['name'], 'type': f['type'], 'offset': offset, 'length': length, 'bytes': size})
+        offset += size
+    return round_up(offset), entries
+
+def print_grid_layout(source_dir, cols, rows, profiler=None):
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage('read layout'):
+        fields, align = read_cell_grid_layout(source_dir)
+    total = cols * rows
+    with profiler.stage('layout'):
+        byte_length, entries = compute_grid_layout(fields, total, align)
+    profiler.record_metric('grid_layout', {'cols': cols, 'rows': rows, 'byte_length': byte_length, 'fields': entries})
+    print(f"CellGrid layout for {cols}x{rows} ({total} cells), {len(entries)} fields:")
+    for e in entries:
+        print(f"  {e['offset']:>10}  {e['type'] + 'Array':<13} {e['name']:<22} {format_bytes(e['bytes'])}")
+    print(f"Total: {byte_length} bytes ({format_bytes(byte_length)}), {byte_length / max(total, 1):.1f} B/cell")
+
+# --- Capacity Model ---
+
+def load_capacity_settings(source_dir, config_path=None, preset=None):
+    """
+    Reads the settings the capacity model needs from a saved configuration file
+    (presets/*Presets*.json by default), optionally overlaid with a saved preset.
+    """
+    if not config_path:
+        matches = sorted(glob.glob(os.path.join(source_dir, CAPACITY_PRESETS_GLOB)))
+        if not matches:
+            print(f"Error: No configuration found matching {CAPACITY_PRESETS_GLOB} in {source_dir}. Use --config.")
+            sys.exit(1)
+        config_path = matches[0]
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f: data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: Cannot read configuration {config_path}: {e}")
+        sys.exit(1)
+    if not isinstance(data, dict):
+        print(f"Error: Configuration {config_path} is not a JSON object.")
+        sys.exit(1)
+    state = dict(data.get('state', data))
+    if preset:
+        saved = {p.get('name'): p.get('data', {}) for p in data.get('savedPresets', [])}
+        if preset not in saved:
+            print(f"Error: Preset '{preset}' not found in {config_path}. Available: {', '.join(n for n in saved if n)}")
+            sys.exit(1)
+        state.update(saved[preset])
+    settings = {k: state.get(k, v) for k, v in CAPACITY_SETTINGS.items()}
+    for k, v in settings.items():
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+            print(f"Error: Setting '{k}' must be a number (got {v!r}) in {config_path}" + (f" / preset '{preset}'." if preset else "."))
+            sys.exit(1)
+        if k in CAPACITY_POSITIVE_SETTINGS and v <= 0:
+            print(f"Error: Setting '{k}' must be greater than 0 (got {v!r}) in {config_path}" + (f" / preset '{preset}'." if preset else "."))
+            sys.exit(1)
+    return settings, config_path
+
+def parse_display(spec):
+    m = re.fullmatch(r'(\d+)[xX](\d+)', spec.strip())
+    if not m:
+        print(f"Error: Invalid display resolution '{spec}' (expected WIDTHxHEIGHT).")
+        sys.exit(1)
+    return int(m.group(1)), int(m.group(2))
+
+def estimate_capacity(fields, align, settings, width, height, glyphs=ATLAS_MIN_CAPACITY):
+    """
+    Models one display of width x height CSS pixels: grid size (MatrixKernel resize
+    snapping), simulation buffer bytes, GPU memory and per-frame upload bytes.
+    """
+    s = settings
+    logical_w = width / s['stretchX']
+    logical_h = height / s['stretchY']
+    target_cell_w = s['fontSize'] * max(0.5, s['horizontalSpacingFactor'])
+    cols = max(1, round(logical_w / target_cell_w))
+    cell_h = s['fontSize'] * max(0.5, s['verticalSpacingFactor']) * (logical_w / cols) / target_cell_w
+    rows = math.ceil(logical_h / cell_h)
+    cells = cols * rows
+
+    grid_bytes, _ = compute_grid_layout(fields, cells, align)
+    sim_bytes = grid_bytes * GRID_WORLDS
+
+    # Render targets are sized by the resolution scale, not by the grid
+    pw, ph = int(width * s['resolution']), int(height * s['resolution'])
+    fbo_bytes = (FBO_FULL_RES * pw * ph + FBO_HALF_RES * (pw // 2) * (ph // 2)) * FBO_BYTES_PER_PIXEL
+
+    # GlyphAtlas: square cells sized from the tracer font, fixed 2048px wide, grows downward
+    atlas_cell = math.ceil((s['fontSize'] + s['tracerSizeIncrease']) * 1.2 + ATLAS_PADDING)
+    atlas_cols = max(1, ATLAS_TARGET_WIDTH // atlas_cell)
+    atlas_w = atlas_cols * atlas_cell
+    atlas_h = math.ceil(max(glyphs, ATLAS_MIN_CAPACITY) / atlas_cols) * atlas_cell
+    atlas_bytes = atlas_w * atlas_h * 4
+
+    upload_bytes = cells * INSTANCE_STRIDE
+    gpu_bytes = cells * (INSTANCE_STRIDE + POSITION_STRIDE) + fbo_bytes + atlas_bytes
+    return {
+        'display': f"{width}x{height}", 'cols': cols, 'rows': rows, 'cells': cells,
+        'sim_bytes': sim_bytes, 'gpu_bytes': gpu_bytes, 'fbo_bytes': fbo_bytes,
+        'atlas': f"{atlas_w}x{atlas_h}", 'atlas_bytes': atlas_bytes, 'atlas_ok': atlas_h <= ATLAS_MAX_HEIGHT,
+        'upload_bytes': upload_bytes, 'total_bytes': sim_bytes + gpu_bytes
+    }
+
+def report_capacity(source_dir, displays=None, config_path=None, preset=None, fps=60, glyphs=ATLAS_MIN_CAPACITY,
+                    memory_budget=None, bandwidth_budget=None, profiler=None):
+    """Prints the capacity table and returns the number of displays over budget."""
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage('read layout'):
+        fields, align = read_cell_grid_layout(source_dir)
+    with profiler.stage('read config'):
+        settings, config_path = load_capacity_settings(source_dir, config_path, preset)
+    displays = displays or CAPACITY_DISPLAYS
+    print(f"Capacity model: {os.path.basename(config_path)}" + (f" / preset '{preset}'" if preset else ""))
+    print(f"  fontSize {settings['fontSize']}, resolution {settings['resolution']}, spacing "
+          f"{settings['horizontalSpacingFactor']}x{settings['verticalSpacingFactor']}, stretch "
+          f"{settings['stretchX']}x{settings['stretchY']}; {len(fields)} CellGrid fields x {GRID_WORLDS} worlds, {fps} fps")
+    print(f"\n  {'Display':<11}{'Grid':>11}{'Sim buffers':>13}{'GPU mem':>12}{'Atlas':>11}{'Upload/frame':>14}{'Upload/s':>13}  Flags")
+
+    flagged = 0
+    estimates = []
+    for spec in displays:
+        with profiler.stage('estimate'):
+            est = estimate_capacity(fields, align, settings, *parse_display(spec), glyphs=glyphs)
+        per_second = est['upload_bytes'] * fps
+        flags = []
+        if memory_budget is not None and est['total_bytes'] > memory_budget * 1024 * 1024:
+            flags.append(f"memory > {memory_budget:g} MB")
+        if bandwidth_budget is not None and per_second > bandwidth_budget * 1024 * 1024:
+            flags.append(f"upload > {bandwidth_budget:g} MB/s")
+        if not est['atlas_ok']:
+            flags.append(f"atlas height > {ATLAS_MAX_HEIGHT}")
+        if flags: flagged += 1
+        estimates.append(dict(est, upload_bytes_per_second=per_second, flags=flags))
+        print(f"  {est['display']:<11}{est['cols']:>6}x{est['rows']:<4}{format_bytes(est['sim_bytes']):>13}"
+              f"{format_bytes(est['gpu_bytes']):>12}{est['atlas']:>11}{format_bytes(est['upload_bytes']):>14}"
+              f"{format_bytes(per_second) + '/s':>13}  {'OVER BUDGET: ' + ', '.join(flags) if flags else 'ok'}")
+
+    print(f"\n{flagged} of {len(displays)} configurations over budget.")
+    profiler.record_metric('capacity', {'settings': settings, 'fps': fps, 'displays': estimates})
+    return flagged
 
 # --- Combine Logic ---
 
@@ -366,158 +897,447 @@ def validate_unique_classes(source_dir):
     else:
         print("[Validation] Class Uniqueness Check Passed.")
 
-def combine_modular(source_dir, output_file):
-    print(f"Combining {source_dir} into {output_file}...")
-    
-    # Run Validation First
-    validate_unique_classes(source_dir)
+EMBEDDED_ASSETS_PATCH = r"""
+// --- Patch: Integrate Embedded Assets ---
+// Each patch applies once, as soon as its class exists. Classes in deferred chunks
+// are patched when the chunks are evaluated (see the deferred chunk loader).
+const __applyEmbeddedAssetPatches = (function() {
+    // Shaders are stored as chunk reference lists and only materialised when selected
+    const shaderCache = {};
+    const embeddedShader = (name) => {
+        if (typeof __EMBEDDED_ASSETS__ === 'undefined' || !__EMBEDDED_ASSETS__.shaders) return null;
+        const lib = __EMBEDDED_ASSETS__.shaders;
+        if (typeof name !== 'string' || !lib.shaders || !Object.prototype.hasOwnProperty.call(lib.shaders, name)) return null;
+        if (!(name in shaderCache)) {
+            shaderCache[name] = lib.shaders[name].map(p => typeof p === 'number' ? lib.chunks[p] : p).join('\n\n') + '\n';
+        }
+        return shaderCache[name];
+    };
+    const patches = [
+        () => {
+            if (typeof ConfigurationManager === 'undefined') return false;
+            const orig = ConfigurationManager.prototype._loadSlots;
+            ConfigurationManager.prototype._loadSlots = function() {
+                let local = null; try { local = orig.call(this); } catch(e) {}
+                if (local && local.length > 0 && local[0].name) return local;
+                if (typeof __EMBEDDED_ASSETS__ !== 'undefined' && __EMBEDDED_ASSETS__.presets) {
+                    for (const k in __EMBEDDED_ASSETS__.presets) {
+                        const p = __EMBEDDED_ASSETS__.presets[k];
+                        if (p && p.savedPresets) return p.savedPresets;
+                    }
+                }
+                return local || [];
+            };
+            return true;
+        },
+        () => {
+            if (typeof FontManager === 'undefined') return false;
+            const orig = FontManager.prototype.init;
+            FontManager.prototype.init = async function() {
+                await orig.call(this);
+                if (typeof __EMBEDDED_ASSETS__ !== 'undefined' && __EMBEDDED_ASSETS__.fonts) {
+                    for (const [n, d] of Object.entries(__EMBEDDED_ASSETS__.fonts)) {
+                        const fam = n.split('.')[0].replace(/-/g, ' ');
+                        if (this.loadedFonts.some(f => f.name === fam)) continue;
+                        const ok = await this._registerFontFace({ name: fam, sourceUrl: d, formatHint: n.endsWith('woff2')?"format('woff2')":"format('truetype')", canvasPx: 20 });
+                        if (ok) this.loadedFonts.push({ name: fam, display: fam, isEmbedded: true });
+                    }
+                    this._notify();
+                }
+            };
+            return true;
+        },
+        () => {
+            if (typeof UIManager === 'undefined') return false;
+            const orig = UIManager.prototype._loadShaderSource;
+            UIManager.prototype._loadShaderSource = function(filename, configId) {
+                const src = embeddedShader(filename);
+                if (src) { this._applyShaderSource(src, configId, filename); return; }
+                return orig.call(this, filename, configId);
+            };
+            return true;
+        }
+    ];
+    return function() {
+        for (let i = 0; i < patches.length; i++) {
+            if (patches[i] && patches[i]()) patches[i] = null;
+        }
+    };
+})();
+__applyEmbeddedAssetPatches();
+"""
 
-    index_path = os.path.join(source_dir, 'index.html')
-    if not os.path.exists(index_path):
-        print("Error: index.html not found."); return
+DEFERRED_CHUNK_LOADER = r"""
+// --- Deferred Chunks ---
+// Modules that are not needed for the first frame ship as inert
+// <script type="javascript/deferred"> blocks. They are evaluated one per task after
+// the first frame (or after a timeout if no frame is ever drawn). Any user
+// interaction before they are all in evaluates the remaining chunks immediately.
+(function() {
+    const chunks = Array.from(document.querySelectorAll('script[type="javascript/deferred"]'));
+    const interactions = ['pointerdown', 'keydown', 'touchstart'];
+    const FIRST_FRAME_TIMEOUT_MS = 5000;
+    let started = false, done = false, next = 0;
+    const evaluate = (el) => {
+        const script = document.createElement('script');
+        script.textContent = el.textContent;
+        document.head.appendChild(script);
+        el.remove();
+    };
+    const finish = () => {
+        if (done) return;
+        done = true;
+        interactions.forEach(type => window.removeEventListener(type, onInteract, true));
+        __applyEmbeddedAssetPatches();
+        if (window.matrix && typeof window.matrix._initializeUI === 'function') window.matrix._initializeUI();
+    };
+    // Evaluate everything still pending right now
+    const flush = () => {
+        started = true;
+        while (next < chunks.length) evaluate(chunks[next++]);
+        finish();
+    };
+    // Evaluate one chunk per task so the page stays responsive
+    const trickle = () => {
+        if (started) return;
+        started = true;
+        const step = () => {
+            if (done) return;
+            if (next < chunks.length) { evaluate(chunks[next++]); setTimeout(step, 0); }
+            else finish();
+        };
+        step();
+    };
+    const load = (sync) => sync ? flush() : trickle();
+    const onInteract = () => { if (!done) flush(); };
+    window.__loadDeferredChunks = load;
+
+    // Patterns ship in a deferred chunk and become available once it is evaluated;
+    // the kernel must never fall back to fetching js/effects/QuantizedPatterns.js.
+    if (typeof MatrixKernel !== 'undefined') {
+        const orig = MatrixKernel.prototype._loadPatterns;
+        MatrixKernel.prototype._loadPatterns = function() {
+            return window.matrixPatterns ? orig.call(this) : Promise.resolve();
+        };
+    }
+
+    // The standalone editor window needs its UI before the kernel initialises
+    if (new URLSearchParams(window.location.search).get('mode') === 'editor') { load(true); return; }
+
+    interactions.forEach(type => window.addEventListener(type, onInteract, true));
+    const waitForFirstFrame = () => {
+        if (started) return;
+        if (window.matrix && window.matrix.frame > 0) setTimeout(trickle, 0);
+        else requestAnimationFrame(waitForFirstFrame);
+    };
+    requestAnimationFrame(waitForFirstFrame);
+    // No first frame (e.g. WebGL failed to initialise): load anyway so the UI still appears
+    setTimeout(trickle, FIRST_FRAME_TIMEOUT_MS);
+})();
+"""
+
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+
+REGEX_PRECEDING_WORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'yield', 'await'}
+JS_CODE_TOKENS = re.compile(r"[`'\"{}/]")
+JS_TEMPLATE_TOKENS = re.compile(r'\\.|`|\$\{', re.DOTALL)
+JS_STRING_BODIES = {q: re.compile(q + r'(?:\\.|[^' + q + r'\\\n])*' + q + '?', re.DOTALL) for q in '\'"'}
+JS_REGEX_LITERAL = re.compile(r'/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])*/?')
+
+def find_template_spans(code):
+    """
+    Returns (start, end) offsets of the text parts of template literals in a JS
+    module, skipping strings, comments, regex literals and ${...} expressions.
+    Jumps between delimiters with regex searches rather than visiting every character.
+    """
+    spans = []
+    stack = []  # brace depth of each open ${...} expression
+    n = len(code)
+
+    def template_text(start):
+        # Template text runs to the closing backtick (returns its end) or to ${ (pushes an expression)
+        t = JS_TEMPLATE_TOKENS.search(code, start)
+        while t and t.group() not in ('`', '${'): t = JS_TEMPLATE_TOKENS.search(code, t.end())
+        if not t: spans.append((start, n)); return n
+        spans.append((start, t.start()))
+        if t.group() == '${': stack.append(0)
+        return t.end()
+
+    i = 0
+    while i < n:
+        m = JS_CODE_TOKENS.search(code, i)
+        if not m: break
+        i, c = m.start(), m.group()
+        if c == '`':
+            i = template_text(i + 1)
+        elif c in '\'"':
+            i = JS_STRING_BODIES[c].match(code, i).end()
+        elif code.startswith('//', i):
+            i = code.find('\n', i)
+            if i < 0: break
+        elif code.startswith('/*', i):
+            i = code.find('*/', i + 2)
+            if i < 0: break
+            i += 2
+        elif c == '/':
+            j = i - 1
+            while j >= 0 and code[j] in ' \t\r\n': j -= 1
+            prev = code[j] if j >= 0 else ''
+            if not prev or prev in '(,=:[!&|?{};+-*%<>~^': regex = True
+            elif prev.isalnum() or prev in '_$':
+                k = j
+                while k >= 0 and (code[k].isalnum() or code[k] in '_$'): k -= 1
+                regex = code[k + 1:j + 1] in REGEX_PRECEDING_WORDS
+            else: regex = False
+            i = JS_REGEX_LITERAL.match(code, i).end() if regex else i + 1
+        elif c == '{':
+            if stack: stack[-1] += 1
+            i += 1
+        elif stack and stack[-1] == 0:  # '}' closing a ${...} expression
+            stack.pop()
+            i = template_text(i + 1)
+        else:
+            if stack: stack[-1] -= 1
+            i += 1
+    return spans
 
-    with open(index_path, 'r', encoding='utf-8') as f: html_content = f.read()
+def compact_blank_lines(code):
+    """
+    Drops blank lines from a JS module, except inside template literals, where
+    blank lines (embedded shaders, HTML snippets) are part of the string value.
+    """
+    first = code.find('`')
+    # Blank lines before the first backtick can never be template text
+    if first < 0 or not BLANK_LINES_PATTERN.search(code, first): return BLANK_LINES_PATTERN.sub('\n', code)
+    spans = find_template_spans(code)
+    starts = [a for a, _ in spans]
+    def replace(m):
+        k = bisect.bisect_right(starts, m.start()) - 1
+        return m.group(0) if k >= 0 and m.start() < spans[k][1] else '\n'
+    return BLANK_LINES_PATTERN.sub(replace, code)
 
-    css_path = os.path.join(source_dir, 'css/style.css')
-    css_block = ""
-    if os.path.exists(css_path):
-        with open(css_path, 'r', encoding='utf-8') as f: css_block = f.read()
+def read_compacted_module(path, header, profiler=None):
+    """Reads one JS module ('read' stage) and returns it with a header comment, blank lines compacted ('compact' stage)."""
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage('read'):
+        with open(path, 'r', encoding='utf-8') as f: code = f"\n{header}\n{f.read()}\n"
+    with profiler.stage('compact'):
+        return compact_blank_lines(code)
 
-    embedded_shaders = {}
-    shaders_dir = os.path.join(source_dir, 'shaders')
-    if os.path.exists(shaders_dir):
-        for s_file in sorted(os.listdir(shaders_dir)):
-            if s_file.endswith(('.glsl', '.frag', '.vert')):
-                with open(os.path.join(shaders_dir, s_file), 'r', encoding='utf-8') as f: embedded_shaders[s_file] = f.read()
+def iter_worker_block(source_dir, profiler=None):
+    """
+    Yields SimulationWorker.js and its importScripts() dependencies as pieces of a
+    <script type="javascript/worker"> block, one module at a time. Yields nothing
+    when there is no worker.
+    """
+    profiler = profiler or NULL_PROFILER
+    worker_path = os.path.join(source_dir, 'js/simulation/SimulationWorker.js')
+    if not os.path.exists(worker_path): return
+    print("  - Bundling SimulationWorker.js...")
     
-    embedded_presets = {}
+    # Dynamically extract dependencies from importScripts
+    with profiler.stage('read'):
+        with open(worker_path, 'r', encoding='utf-8') as f:
+            worker_code_raw = f.read()
+    with profiler.stage('worker bundling'):
+        imports = re.findall(r"importScripts\(['\"](.*?)['\"]\);", worker_code_raw)
+        worker_code = re.sub(r'importScripts\(.*\);', '', worker_code_raw)
+        
+    yield '<script id="simulation-worker-source" type="javascript/worker">\n'
+    for imp in imports:
+        # Resolve relative path (worker is in js/simulation/)
+        # imp might be '../core/Utils.js'
+        norm_imp = os.path.normpath(os.path.join('js/simulation', imp)).replace('\\', '/')
+        imp_path = os.path.join(source_dir, norm_imp)
+        if os.path.exists(imp_path):
+            dep = read_compacted_module(imp_path, f"// --- Worker Dep: {os.path.basename(norm_imp)} ---", profiler)
+            profiler.record('worker', norm_imp, os.path.getsize(imp_path), utf8_len(dep))
+            yield dep
+        else:
+            print(f"  [Warning] Worker dependency not found: {norm_imp}")
+            
+    with profiler.stage('compact'):
+        worker_main = compact_blank_lines("\n// --- SimulationWorker.js ---\n" + worker_code)
+    profiler.record('worker', 'js/simulation/SimulationWorker.js', os.path.getsize(worker_path), utf8_len(worker_main))
+    yield worker_main
+    yield '\n</script>\n'
+
+def write_embedded_assets(out, source_dir, profiler=None):
+    """
+    Streams `const __EMBEDDED_ASSETS__ = {...}` to out one asset at a time, so only
+    a single preset or font is held in memory. The JSON layout matches a single
+    json.dumps({'shaders', 'presets', 'fonts'}) call.
+    """
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage('shaders'):
+        embedded_shaders = {'chunks': [], 'shaders': {}}
+        shaders_dir = os.path.join(source_dir, 'shaders')
+        if os.path.exists(shaders_dir):
+            embedded_shaders = build_shader_library(shaders_dir)
+            print(f"  - Shader library: {len(embedded_shaders['shaders'])} shaders, {len(embedded_shaders['chunks'])} shared chunks")
+            for s_file, parts in embedded_shaders['shaders'].items():
+                profiler.record('shaders', s_file, os.path.getsize(os.path.join(shaders_dir, s_file)), utf8_len(json.dumps(parts)))
+            profiler.record('shaders', '(shared chunks)', 0, utf8_len(json.dumps(embedded_shaders['chunks'])))
+        shaders_json = json.dumps(embedded_shaders)
+    with profiler.stage('write'):
+        out.write(f'<script>const __EMBEDDED_ASSETS__ = {{"shaders": {shaders_json}, "presets": {{')
+
     presets_dir = os.path.join(source_dir, 'presets')
     if os.path.exists(presets_dir):
-         for p_file in sorted(os.listdir(presets_dir)):
-             if p_file.endswith('.json'):
-                 with open(os.path.join(presets_dir, p_file), 'r', encoding='utf-8') as f:
-                     try: embedded_presets[p_file] = json.load(f)
-                     except: pass
+        sep = ''
+        for p_file in sorted(os.listdir(presets_dir)):
+            if p_file.endswith('.json'):
+                with profiler.stage('read'):
+                    with open(os.path.join(presets_dir, p_file), 'r', encoding='utf-8') as f: raw = f.read()
+                with profiler.stage('presets'):
+                    try: preset_json = json.dumps(json.loads(raw))
+                    except: continue
+                with profiler.stage('write'):
+                    out.write(f'{sep}{json.dumps(p_file)}: {preset_json}'); sep = ', '
+                profiler.record('presets', p_file, os.path.getsize(os.path.join(presets_dir, p_file)), utf8_len(preset_json))
 
-    embedded_fonts = {}
+    with profiler.stage('write'):
+        out.write('}, "fonts": {')
     fonts_dir = os.path.join(source_dir, 'fonts')
     if os.path.exists(fonts_dir):
+        sep = ''
         for f_file in sorted(os.listdir(fonts_dir)):
             if f_file.endswith(('.woff2', '.ttf', '.otf')):
-                with open(os.path.join(fonts_dir, f_file), 'rb') as f:
-                    data = base64.b64encode(f.read()).decode('utf-8')
+                with profiler.stage('read'):
+                    with open(os.path.join(fonts_dir, f_file), 'rb') as f:
+                        raw = f.read()
+                with profiler.stage('encode fonts'):
+                    data = base64.b64encode(raw).decode('utf-8')
                     mtype = 'font/woff2' if f_file.endswith('woff2') else 'application/octet-stream'
-                    embedded_fonts[f_file] = f"data:{mtype};base64,{data}"
+                    data_uri = f"data:{mtype};base64,{data}"
+                with profiler.stage('write'):
+                    out.write(f'{sep}{json.dumps(f_file)}: {json.dumps(data_uri)}'); sep = ', '
+                profiler.record('fonts', f_file, len(raw), utf8_len(data_uri))
 
-    load_order = get_dependency_order(source_dir)
-    js_combined = ""
-    for rel_path in load_order:
-        full_path = os.path.join(source_dir, rel_path)
-        if os.path.exists(full_path):
-            with open(full_path, 'r', encoding='utf-8') as f:
-                js_combined += f"\n// --- {os.path.basename(rel_path)} ---\n{f.read()}\n"
+    with profiler.stage('write'):
+        out.write('}};</script>\n')
 
-    worker_block = ""
-    worker_path = os.path.join(source_dir, 'js/simulation/SimulationWorker.js')
-    if os.path.exists(worker_path):
-        print("  - Bundling SimulationWorker.js...")
-        
-        # Dynamically extract dependencies from importScripts
-        worker_code_raw = ""
-        with open(worker_path, 'r', encoding='utf-8') as f:
-            worker_code_raw = f.read()
-            
-        imports = re.findall(r"importScripts\(['\"](.*?)['\"]\);", worker_code_raw)
-        worker_code = ""
-        for imp in imports:
-            # Resolve relative path (worker is in js/simulation/)
-            # imp might be '../core/Utils.js'
-            norm_imp = os.path.normpath(os.path.join('js/simulation', imp)).replace('\\', '/')
-            imp_path = os.path.join(source_dir, norm_imp)
-            if os.path.exists(imp_path):
-                with open(imp_path, 'r', encoding='utf-8') as f:
-                    worker_code += f"\n// --- Worker Dep: {os.path.basename(norm_imp)} ---\n{f.read()}\n"
-            else:
-                print(f"  [Warning] Worker dependency not found: {norm_imp}")
-                
-        worker_code += "\n// --- SimulationWorker.js ---\n" + re.sub(r'importScripts\(.*\);', '', worker_code_raw)
-        worker_block = f"""<script id="simulation-worker-source" type="javascript/worker">
-{worker_code}
-</script>"""
+def combine_modular(source_dir, output_file, profiler=None, code_split=True):
+    """
+    Streams the release build to output_file in document order: page template,
+    CSS, embedded assets, worker block, then each JS module. Only one module or
+    asset is held in memory at a time, and blank-line compaction is applied per
+    piece (see compact_blank_lines) instead of over the finished document.
 
-    assets_json = json.dumps({'shaders': embedded_shaders, 'presets': embedded_presets, 'fonts': embedded_fonts})
-    
-    patch_code = r"""
-// --- Patch: Integrate Embedded Assets ---
-(function() {
-    if (typeof ConfigurationManager !== 'undefined') {
-        const orig = ConfigurationManager.prototype._loadSlots;
-        ConfigurationManager.prototype._loadSlots = function() {
-            let local = null; try { local = orig.call(this); } catch(e) {}
-            if (local && local.length > 0 && local[0].name) return local;
-            if (typeof __EMBEDDED_ASSETS__ !== 'undefined' && __EMBEDDED_ASSETS__.presets) {
-                for (const k in __EMBEDDED_ASSETS__.presets) {
-                    const p = __EMBEDDED_ASSETS__.presets[k];
-                    if (p && p.savedPresets) return p.savedPresets;
-                }
-            }
-            return local || [];
-        };
-    }
-    if (typeof FontManager !== 'undefined') {
-        const orig = FontManager.prototype.init;
-        FontManager.prototype.init = async function() {
-            await orig.call(this);
-            if (typeof __EMBEDDED_ASSETS__ !== 'undefined' && __EMBEDDED_ASSETS__.fonts) {
-                for (const [n, d] of Object.entries(__EMBEDDED_ASSETS__.fonts)) {
-                    const fam = n.split('.')[0].replace(/-/g, ' ');
-                    if (this.loadedFonts.some(f => f.name === fam)) continue;
-                    const ok = await this._registerFontFace({ name: fam, sourceUrl: d, formatHint: n.endsWith('woff2')?"format('woff2')":"format('truetype')", canvasPx: 20 });
-                    if (ok) this.loadedFonts.push({ name: fam, display: fam, isEmbedded: true });
-                }
-                this._notify();
-            }
-        };
-    }
-    if (typeof PostProcessor !== 'undefined') {
-        const orig = PostProcessor.prototype.compileShader;
-        PostProcessor.prototype.compileShader = function(src) {
-            if (typeof __EMBEDDED_ASSETS__ !== 'undefined' && __EMBEDDED_ASSETS__.shaders && __EMBEDDED_ASSETS__.shaders[src]) {
-                src = __EMBEDDED_ASSETS__.shaders[src];
-            }
-            return orig.call(this, src);
-        };
-    }
-})();
-"""
-    html_content = re.sub(r'<link rel="stylesheet" href="css/style.css">', f'<style>\n{css_block}\n</style>', html_content)
-    html_content = re.sub(r'<script src="(js/.*?|main\.js)".*?></script>', '', html_content)
-    
-    payload = f"""<script>const __EMBEDDED_ASSETS__ = {assets_json};</script>
-{worker_block}
-<script>
-{js_combined}
-{patch_code}
-</script>"""
+    With code_split, modules off the critical path (see compute_critical_path)
+    are written as inert deferred chunks ahead of the boot script, which
+    evaluates them after the first frame.
+    """
+    profiler = profiler or NULL_PROFILER
+    print(f"Combining {source_dir} into {output_file}...")
     
-    if '<!-- Dev Scripts -->' in html_content:
-        html_content = html_content.replace('<!-- Dev Scripts -->', payload)
+    # Run Validation First
+    with profiler.stage('validate'):
+        validate_unique_classes(source_dir)
+
+    index_path = os.path.join(source_dir, 'index.html')
+    if not os.path.exists(index_path):
+        print("Error: index.html not found."); return
+
+    with profiler.stage('read'):
+        with open(index_path, 'r', encoding='utf-8') as f: html_content = f.read()
+        html_content = re.sub(r'<script src="(js/.*?|main\.js)".*?></script>', '', html_content)
+        html_content = re.sub(r'<link rel="stylesheet" href="css/style.css">', '\x00CSS\x00', html_content)
+        if '<!-- Dev Scripts -->' in html_content:
+            html_content = html_content.replace('<!-- Dev Scripts -->', '\x00PAYLOAD\x00')
+        else:
+            html_content = html_content.replace('</body>', '\x00PAYLOAD\x00</body>')
+        template = re.split('(\x00CSS\x00|\x00PAYLOAD\x00)', html_content)
+
+    if code_split:
+        load_order, deferred = get_boot_split(source_dir, profiler)
     else:
-        html_content = html_content.replace('</body>', payload + '</body>')
+        load_order, deferred = get_dependency_order(source_dir, profiler), []
+    boot_bytes = deferred_bytes = 0
+
+    # Stream into a temp file and swap it in only once the build succeeds, so an
+    # aborted build (e.g. a missing #include) never truncates the previous release.
+    ensure_dir(output_file)
+    tmp_file = output_file + '.tmp'
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as out:
+            for segment in template:
+                if segment == '\x00CSS\x00':
+                    css_path = os.path.join(source_dir, 'css/style.css')
+                    if not os.path.exists(css_path): continue
+                    with profiler.stage('read'):
+                        with open(css_path, 'r', encoding='utf-8') as f: css_block = f.read()
+                    with profiler.stage('compact'):
+                        css_block = BLANK_LINES_PATTERN.sub('\n', css_block)
+                    with profiler.stage('write'):
+                        out.write(f'<style>\n{css_block}\n</style>')
+                    profiler.record('css', 'style.css', os.path.getsize(css_path), utf8_len(css_block))
+
+                elif segment == '\x00PAYLOAD\x00':
+                    write_embedded_assets(out, source_dir, profiler)
+
+                    for piece in iter_worker_block(source_dir, profiler):
+                        with profiler.stage('write'): out.write(piece)
+
+                    for rel_path in deferred:
+                        full_path = os.path.join(source_dir, rel_path)
+                        module = read_compacted_module(full_path, f"// --- {os.path.basename(rel_path)} ---", profiler)
+                        with profiler.stage('write'):
+                            out.write(f'<script type="javascript/deferred" data-module="{rel_path}">{module}</script>\n')
+                        deferred_bytes += utf8_len(module)
+                        profiler.record('js deferred', rel_path, os.path.getsize(full_path), utf8_len(module))
+
+                    with profiler.stage('write'): out.write('<script>\n')
+                    for rel_path in load_order:
+                        full_path = os.path.join(source_dir, rel_path)
+                        if os.path.exists(full_path):
+                            module = read_compacted_module(full_path, f"// --- {os.path.basename(rel_path)} ---", profiler)
+                            with profiler.stage('write'): out.write(module)
+                            boot_bytes += utf8_len(module)
+                            profiler.record('js modules', rel_path, os.path.getsize(full_path), utf8_len(module))
+
+                    with profiler.stage('patch injection'):
+                        patch = compact_blank_lines(EMBEDDED_ASSETS_PATCH)
+                        profiler.record('patch', 'embedded assets patch', 0, utf8_len(EMBEDDED_ASSETS_PATCH))
+                        if deferred:
+                            patch += compact_blank_lines(DEFERRED_CHUNK_LOADER)
+                            profiler.record('patch', 'deferred chunk loader', 0, utf8_len(DEFERRED_CHUNK_LOADER))
+                    with profiler.stage('write'): out.write(patch + '</script>')
+
+                else:
+                    with profiler.stage('compact'):
+                        segment = BLANK_LINES_PATTERN.sub('\n', segment)
+                    with profiler.stage('write'): out.write(segment)
+    except BaseException:
+        if os.path.exists(tmp_file): os.remove(tmp_file)
+        raise
+    os.replace(tmp_file, output_file)
 
-    with open(output_file, 'w', encoding='utf-8') as f: f.write(re.sub(r'\n\s*\n', '\n', html_content))
+    if code_split:
+        total = (boot_bytes + deferred_bytes) or 1
+        print(f"  - Critical path: {len(load_order)} modules, {format_bytes(boot_bytes)} ({boot_bytes * 100 / total:.1f}% of JS); "
+              f"deferred: {len(deferred)} modules, {format_bytes(deferred_bytes)}")
+        profiler.record_metric('critical_path', {
+            'boot_modules': load_order, 'boot_bytes': boot_bytes,
+            'deferred_modules': deferred, 'deferred_bytes': deferred_bytes
+        })
+    profiler.record_output(output_file)
     print(f"Build complete: {output_file}")
 
-def refresh_dev_index(source_dir):
+def refresh_dev_index(source_dir, profiler=None):
+    profiler = profiler or NULL_PROFILER
     print(f"Refreshing index.html in {source_dir}...")
     index_path = os.path.join(source_dir, 'index.html')
-    with open(index_path, 'r', encoding='utf-8') as f: content = f.read()
+    with profiler.stage('read'):
+        with open(index_path, 'r', encoding='utf-8') as f: content = f.read()
     content = re.sub(r'\s*<script src="(js/.*?|main\.js)".*?></script>', '', content)
-    load_order = get_dependency_order(source_dir)
+    load_order = get_dependency_order(source_dir, profiler)
     scripts_block = "".join([f'    <script src="{s}"></script>\n' for s in load_order])
     if '<!-- Dev Scripts -->' in content: content = content.replace('<!-- Dev Scripts -->', '<!-- Dev Scripts -->\n' + scripts_block)
     else: content = content.replace('</body>', scripts_block + '</body>')
-    with open(index_path, 'w', encoding='utf-8') as f: f.write(content)
+    with profiler.stage('write'):
+        with open(index_path, 'w', encoding='utf-8') as f: f.write(content)
+    profiler.record_output(index_path)
     print(f"Updated index.html with {len(load_order)} scripts.")
 
 if __name__ == "__main__":
@@ -525,9 +1345,36 @@ if __name__ == "__main__":
     subparsers = parser.add_subparsers(dest='command')
     s_p = subparsers.add_parser('split'); s_p.add_argument('input'); s_p.add_argument('output')
     c_p = subparsers.add_parser('combine'); c_p.add_argument('input'); c_p.add_argument('output')
+    c_p.add_argument('--no-split', action='store_true', help="Ship all modules in one boot script instead of deferring non-critical ones")
     r_p = subparsers.add_parser('refresh'); r_p.add_argument('input')
+    l_p = subparsers.add_parser('layout', help="Print the CellGrid shared buffer layout for a grid size")
+    l_p.add_argument('input'); l_p.add_argument('--cols', type=int, default=192); l_p.add_argument('--rows', type=int, default=54)
+    k_p = subparsers.add_parser('capacity', help="Estimate grid memory and per-frame upload for display resolutions")
+    k_p.add_argument('input')
+    k_p.add_argument('--displays', nargs='+', metavar='WxH', help="Display resolutions in CSS pixels (default: common single and multi-monitor sizes)")
+    k_p.add_argument('--config', help="Saved configuration JSON (default: presets/*Presets*.json in input)")
+    k_p.add_argument('--preset', help="Name of a saved preset in the configuration to apply")
+    k_p.add_argument('--fps', type=int, default=60)
+    k_p.add_argument('--glyphs', type=int, default=ATLAS_MIN_CAPACITY, help="Distinct glyphs cached in the atlas")
+    k_p.add_argument('--memory-budget', type=float, metavar='MB', help="Flag displays whose simulation + GPU memory exceeds this")
+    k_p.add_argument('--bandwidth-budget', type=float, metavar='MB/s', help="Flag displays whose WebGL upload rate exceeds this")
+    for sub in (s_p, c_p, r_p, l_p, k_p):
+        sub.add_argument('--profile', nargs='?', const='build_profile.json', default=None, metavar='REPORT',
+                         help="Record per-stage time and per-asset bytes to a JSON report (default: build_profile.json)")
+        sub.add_argument('--profile-memory', action='store_true',
+                         help="Also trace peak memory per stage (implies --profile; slows the build, so timings are inflated)")
     args = parser.parse_args()
-    if args.command == 'split': split_monolith(args.input, args.output)
-    elif args.command == 'combine': combine_modular(args.input, args.output)
-    elif args.command == 'refresh': refresh_dev_index(args.input)
-    else: parser.print_help()
\ No newline at end of file
+    if getattr(args, 'profile_memory', False) and not args.profile: args.profile = 'build_profile.json'
+    profiler = BuildProfiler(args.command, enabled=bool(getattr(args, 'profile', None)),
+                             trace_memory=getattr(args, 'profile_memory', False))
+    profiler.start()
+    if args.command == 'split': split_monolith(args.input, args.output, profiler)
+    elif args.command == 'combine': combine_modular(args.input, args.output, profiler, code_split=not args.no_split)
+    elif args.command == 'refresh': refresh_dev_index(args.input, profiler)
+    elif args.command == 'layout': print_grid_layout(args.input, args.cols, args.rows, profiler)
+    elif args.command == 'capacity':
+        over_budget = report_capacity(args.input, args.displays, args.config, args.preset, args.fps, args.glyphs,
+                                      args.memory_budget, args.bandwidth_budget, profiler)
+    else: parser.print_help()
+    if profiler.enabled: profiler.finish(args.profile)
+    if args.command == 'capacity' and over_budget: sys.exit(1)
\ No newline at end of file